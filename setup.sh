@@ -24,6 +24,7 @@ cd "$ROOT"
 python -m venv venv_metrics || true
 source venv_metrics/bin/activate
 pip install -r tools/requirements.txt
+python tools/_metrics_native.py || true  # optional AOT build; JIT fallback if it fails
 python tools/collect_metrics.py --backtest starter-A/output/results.csv --robot starter-C/logs/summary.json --out output/metrics.json
 deactivate
 
@@ -1,17 +1,65 @@
+import array
 import numpy as np
+from numba import njit
+
+@njit(inline='always')
+def _pid_axis(kp, ki, kd, e, integral, prev_error, i):
+    # the one PID update for axis i; every kernel below inlines it
+    integral[i] += e
+    d = e - prev_error[i]
+    prev_error[i] = e
+    return kp * e + ki * integral[i] + kd * d
+
+@njit('void(f8, f8, f8, f8[:], f8[:], f8[:], f8[:])', cache=True, fastmath=True)
+def _pid_step(kp, ki, kd, error, integral, prev_error, out):
+    # explicit loop over the 3 axes; avoids NumPy dispatch on tiny arrays
+    for i in range(3):
+        out[i] = _pid_axis(kp, ki, kd, error[i], integral, prev_error, i)
+
+@njit('void(f8[:], f8[:], f8[:], f8[:], f8, f8, f8, f8[:])', cache=True, fastmath=True)
+def _pid_force(target, current, integral, prev_error, kp, ki, kd, out):
+    # error, PID update and force in one loop; no intermediate error array
+    for i in range(3):
+        out[i] = _pid_axis(kp, ki, kd, target[i] - current[i], integral, prev_error, i)
+
+@njit('void(f8, f8, f8, f8[:, :], f8[:, :], f8[:, :], f8[:, :], b1[:])', cache=True, fastmath=True)
+def _pid_step_batch(kp, ki, kd, errors, integral, prev_error, out, done):
+    # one PID update per env row; finished envs keep their state and get zero force
+    for k in range(errors.shape[0]):
+        if done[k]:
+            out[k, 0] = 0.0; out[k, 1] = 0.0; out[k, 2] = 0.0
+            continue
+        for i in range(3):
+            out[k, i] = _pid_axis(kp, ki, kd, errors[k, i], integral[k], prev_error[k], i)
 
 class AgentPID:
-    def __init__(self, pid_params):
-        self.kp = pid_params['kp']
-        self.ki = pid_params['ki']
-        self.kd = pid_params['kd']
-        self._integral = np.zeros(3)
-        self._previous_error = np.zeros(3)
+    def __init__(self, pid_params, num_envs=1):
+        self.kp = float(pid_params['kp'])
+        self.ki = float(pid_params['ki'])
+        self.kd = float(pid_params['kd'])
+        self.num_envs = num_envs
+        # state is (num_envs, 3); the single-env compute() uses row 0
+        self._integral = np.zeros((num_envs, 3))
+        self._previous_error = np.zeros((num_envs, 3))
+        self._out = np.zeros((num_envs, 3))
+        self._row0 = (self._integral[0], self._previous_error[0], self._out[0])
+        # force() writes through this ndarray view into an array.array, which
+        # pybullet unpacks much faster than an ndarray
+        self.force_buf = array.array('d', bytes(24))
+        self._force_out = np.frombuffer(self.force_buf, dtype=np.float64)
 
     def compute(self, error):
-        self._integral += error
-        derivative = error - self._previous_error
-        self._previous_error = error
+        integral, prev_error, out = self._row0
+        _pid_step(self.kp, self.ki, self.kd, np.asarray(error, dtype=np.float64), integral, prev_error, out)
+        return out
+
+    def force(self, target, current):
+        # same as compute(target - current) without materializing the error;
+        # returns force_buf, which is overwritten by the next call
+        integral, prev_error, _ = self._row0
+        _pid_force(target, current, integral, prev_error, self.kp, self.ki, self.kd, self._force_out)
+        return self.force_buf
 
-        output = self.kp * error + self.ki * self._integral + self.kd * derivative
-        return output
\ No newline at end of file
+    def compute_batch(self, errors, done):
+        _pid_step_batch(self.kp, self.ki, self.kd, errors, self._integral, self._previous_error, self._out, done)
+        return self._out
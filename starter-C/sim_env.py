@@ -1,6 +1,10 @@
 import pybullet as p
 import pybullet_data
 import time
+import math
+import importlib.util
+import struct
+import zlib
 import numpy as np
 import yaml
 import argparse
@@ -9,72 +13,288 @@ import json
 
 from agent_pid import AgentPID
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# fixed column types for summaries.parquet rows, so every episode file shares one schema
+SUMMARY_SCHEMA = pa.schema([
+    ('simulation_time', pa.float64()),
+    ('path_efficiency', pa.float64()),
+    ('collision_rate', pa.float64()),
+    ('success_rate', pa.float64()),
+    ('num_envs', pa.int64()),
+]) if pa is not None else None
+
+def _write_png(path, rgba):
+    # minimal RGBA PNG writer so the final view needs no imaging library
+    h, w = rgba.shape[:2]
+    rows = np.concatenate([np.zeros((h, 1), dtype=np.uint8), rgba.reshape(h, w * 4)], axis=1)
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', w, h, 8, 6, 0, 0, 0)))
+        f.write(chunk(b'IDAT', zlib.compress(rows.tobytes())))
+        f.write(chunk(b'IEND', b''))
+
 class SimEnv:
     def __init__(self, config, headless=False):
         self.config = config
         self.headless = headless
         p.connect(p.DIRECT if self.headless else p.GUI)
         p.setAdditionalSearchPath(pybullet_data.getDataPath())
+
+        # headless runs that still want the final view render offscreen on the GPU
+        self.render = bool(config.get('render', False))
+        self._egl_plugin = self._load_egl() if (self.headless and self.render) else None
         p.setGravity(0, 0, -9.81)
 
+        # throughput-oriented solver defaults; any setPhysicsEngineParameter keyword
+        # can be overridden from the config's physics section
+        physics = {
+            'numSolverIterations': 10,
+            'numSubSteps': 1,
+            'fixedTimeStep': 1. / 240.,
+            'enableConeFriction': 0,
+            'deterministicOverlappingPairs': 1,
+        }
+        physics.update(config.get('physics') or {})
+        p.setPhysicsEngineParameter(**physics)
+        p.setRealTimeSimulation(0)
+        self.time_step = physics['fixedTimeStep']
+
         self.plane_id = p.loadURDF("plane.urdf")
-        self.robot_id = p.loadURDF("r2d2.urdf", config['start_pos'])
 
-        self.agent = AgentPID(config['pid'])
-        self.target_pos = np.array(config['target_pos'])
+        # num_envs > 1 loads that many robots into the same server, each in its
+        # own lane offset along y, and steps them together (see _rollout_batch)
+        self.num_envs = int(config.get('num_envs', 1))
+        self.offsets = np.zeros((self.num_envs, 3))
+        self.offsets[:, 1] = np.arange(self.num_envs) * float(config.get('env_spacing', 2.0))
+        self.start_pos = np.array(config['start_pos'], dtype=np.float64)
+        self.robot_ids = np.array(
+            [p.loadURDF("r2d2.urdf", (self.start_pos + off).tolist()) for off in self.offsets],
+            dtype=np.int32)
+        self.robot_id = int(self.robot_ids[0])
+
+        self.agent = AgentPID(config['pid'], num_envs=self.num_envs)
+        self.target_pos = np.array(config['target_pos'], dtype=np.float64)
+        self.targets = self.target_pos + self.offsets
+        # start->target distance is the same in every lane; path_efficiency reuses it
+        self.straight_dist = float(np.linalg.norm(self.target_pos - self.start_pos))
+        self.env_metrics = {}
+
+        # per-step scratch buffers, filled in place by _rollout
+        self._cur = np.empty(3)
 
     def run_simulation(self):
+        log_dir = self.config.get('log_dir', 'logs')
+        if not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+
         start_time = time.time()
+        if self.num_envs > 1:
+            rollout = self._rollout_batch()
+        else:
+            rollout = self._rollout()
+        end_time = time.time()
+
+        metrics = {'simulation_time': end_time - start_time}
+        metrics.update(rollout)
+
+        print("Simulation metrics:", metrics)
+
+        # Save summary
+        with open(os.path.join(log_dir, 'summary.json'), 'w') as f:
+            json.dump(metrics, f, indent=2)
+        # and append it as one row of the per-episode Parquet dataset
+        if pq is not None:
+            table = pa.table({k: [metrics[k]] for k in SUMMARY_SCHEMA.names}, schema=SUMMARY_SCHEMA)
+            pq.write_to_dataset(table, root_path=os.path.join(log_dir, 'summaries.parquet'))
+
+        # Save a screenshot
+        if self.render:
+            self._save_view(os.path.join(log_dir, 'final_view.png'))
+
+        p.disconnect()
+        return metrics
+
+    @staticmethod
+    def _load_egl():
+        # returns the EGL renderer plugin id, or None when EGL is unavailable
+        spec = importlib.util.find_spec('eglRenderer')
+        try:
+            if spec is not None:
+                plugin = p.loadPlugin(spec.origin, "_eglRendererPlugin")
+            else:
+                plugin = p.loadPlugin("eglRendererPlugin")
+        except p.error:
+            return None
+        return plugin if plugin >= 0 else None
+
+    def _save_view(self, path, width=640, height=480):
+        # GUI and EGL contexts can use the OpenGL renderer; plain DIRECT falls back to the CPU one
+        if self.headless and self._egl_plugin is None:
+            renderer = p.ER_TINY_RENDERER
+        else:
+            renderer = p.ER_BULLET_HARDWARE_OPENGL
+        view = p.computeViewMatrixFromYawPitchRoll(
+            cameraTargetPosition=((self.start_pos + self.target_pos) / 2).tolist(),
+            distance=10, yaw=45, pitch=-45, roll=0, upAxisIndex=2)
+        proj = p.computeProjectionMatrixFOV(fov=60, aspect=width / height, nearVal=0.1, farVal=100)
+        _, _, rgba, _, _ = p.getCameraImage(width, height, view, proj, renderer=renderer)
+        _write_png(path, np.asarray(rgba, dtype=np.uint8).reshape(height, width, 4))
+
+    def _rollout(self):
         collisions = 0
         path_length = 0
-        last_pos = np.array(p.getBasePositionAndOrientation(self.robot_id)[0])
+        reached = False
+        lx, ly, lz = p.getBasePositionAndOrientation(self.robot_id)[0]
 
-        log_dir = self.config.get('log_dir', 'logs')
-        if not os.path.exists(log_dir):
-            os.makedirs(log_dir)
+        cur, target = self._cur, self.target_pos
+        tx, ty, tz = target.tolist()
 
-        for i in range(self.config['max_steps']):
-            current_pos, _ = p.getBasePositionAndOrientation(self.robot_id)
-            current_pos = np.array(current_pos)
+        # bind hot-loop lookups to locals once
+        _getpose = p.getBasePositionAndOrientation
+        _apply = p.applyExternalForce
+        _step = p.stepSimulation
+        _contact = p.getContactPoints
+        _sleep = time.sleep
+        _sqrt = math.sqrt
+        _wf = p.WORLD_FRAME
+        _rid = self.robot_id
+        _force = self.agent.force
+        _tol2 = float(self.config['tolerance']) ** 2
+        _max = int(self.config['max_steps'])
+        _headless = self.headless
+        _dt = self.time_step
+        # GUI runs are held to real time by sleeping off the lag every _sync steps
+        _sync = int(self.config.get('sync_every', 8))
+        _clock = time.perf_counter
+        # contacts are only sampled every _stride steps, each hit counting for _stride
+        _stride = int(self.config.get('contact_stride', 1))
 
-            error = self.target_pos - current_pos
-            if np.linalg.norm(error) < self.config['tolerance']:
+        t0 = _clock()
+        for i in range(_max):
+            pos = _getpose(_rid)[0]
+            x, y, z = pos
+            dx = tx - x; dy = ty - y; dz = tz - z
+            if dx*dx + dy*dy + dz*dz < _tol2:
                 print("Target reached!")
+                reached = True
                 break
 
-            control_force = self.agent.compute(error)
-            p.applyExternalForce(self.robot_id, -1, control_force, current_pos, p.WORLD_FRAME)
-
-            p.stepSimulation()
-            if not self.headless:
-                time.sleep(1./240.)
+            cur[0] = x; cur[1] = y; cur[2] = z
+            control_force = _force(target, cur)
+            # pass the pose tuple and the force array.array: both take pybullet's
+            # fast sequence path, unlike ndarrays
+            _apply(_rid, -1, control_force, pos, _wf)
 
-            path_length += np.linalg.norm(current_pos - last_pos)
-            last_pos = current_pos
+            _step()
+            if not _headless and i % _sync == 0:
+                lag = (i + 1) * _dt - (_clock() - t0)
+                if lag > 0:
+                    _sleep(lag)
 
-            if len(p.getContactPoints(self.robot_id)) > 0:
-                collisions +=1
+            path_length += _sqrt((x - lx)**2 + (y - ly)**2 + (z - lz)**2)
+            lx, ly, lz = x, y, z
 
-        end_time = time.time()
+            if i % _stride == 0 and _contact(bodyA=_rid):
+                collisions += _stride
 
-        metrics = {
-            'simulation_time': end_time - start_time,
-            'path_efficiency': np.linalg.norm(self.target_pos - np.array(self.config['start_pos'])) / path_length if path_length > 0 else 0,
-            'collision_rate': collisions / self.config['max_steps'],
+        collisions = min(collisions, _max)
+        return {
+            'path_efficiency': self.straight_dist / path_length if path_length > 0 else 0.0,
+            'collision_rate': collisions / _max,
+            # same keys as the batched rollout so episode summaries share a schema
+            'success_rate': 1.0 if reached else 0.0,
+            'num_envs': 1,
         }
 
-        print("Simulation metrics:", metrics)
+    def _rollout_batch(self):
+        n = self.num_envs
+        rids = self.robot_ids.tolist()
+        targets = self.targets
+        positions = np.empty((n, 3))
+        errors = np.empty((n, 3))
+        delta = np.empty((n, 3))
+        dist2 = np.empty(n)
+        done = np.zeros(n, dtype=np.bool_)
+        reached = np.zeros(n, dtype=np.bool_)
+        collisions = np.zeros(n, dtype=np.int64)
+        path_length = np.zeros(n)
 
-        # Save summary
-        with open(os.path.join(log_dir, 'summary.json'), 'w') as f:
-            json.dump(metrics, f, indent=2)
+        _getpose = p.getBasePositionAndOrientation
+        _apply = p.applyExternalForce
+        _step = p.stepSimulation
+        _contact = p.getContactPoints
+        _sleep = time.sleep
+        _wf = p.WORLD_FRAME
+        _compute = self.agent.compute_batch
+        _tol2 = float(self.config['tolerance']) ** 2
+        _max = int(self.config['max_steps'])
+        _headless = self.headless
+        _dt = self.time_step
+        # GUI runs are held to real time by sleeping off the lag every _sync steps
+        _sync = int(self.config.get('sync_every', 8))
+        _clock = time.perf_counter
+        _stride = int(self.config.get('contact_stride', 1))
 
-        # Save a screenshot
-        if not self.headless:
-            p.getScreenshot(os.path.join(log_dir, 'final_view.png'))
+        last = np.array([_getpose(r)[0] for r in rids])
 
-        p.disconnect()
-        return metrics
+        t0 = _clock()
+        for i in range(_max):
+            poses = [_getpose(r)[0] for r in rids]
+            positions[:] = poses
+            np.subtract(targets, positions, out=errors)
+            # squared distance vs tolerance**2: no sqrt, no temporaries
+            np.einsum('ij,ij->i', errors, errors, out=dist2)
+            np.less(dist2, _tol2, out=reached)
+            done |= reached
+            if done.all():
+                print("All targets reached!")
+                break
+
+            forces = _compute(errors, done).tolist()
+            active = np.flatnonzero(~done).tolist()
+            # applyExternalForce has no batched form; this is the only per-env C call.
+            # Rows go in as plain lists/tuples rather than ndarray views.
+            for k in active:
+                _apply(rids[k], -1, forces[k], poses[k], _wf)
+
+            _step()
+            if not _headless and i % _sync == 0:
+                lag = (i + 1) * _dt - (_clock() - t0)
+                if lag > 0:
+                    _sleep(lag)
+
+            np.subtract(positions, last, out=delta)
+            np.einsum('ij,ij->i', delta, delta, out=dist2)
+            np.sqrt(dist2, out=dist2)
+            path_length[active] += dist2[active]
+            last[:] = positions
+
+            if i % _stride == 0:
+                for k in active:
+                    if _contact(bodyA=rids[k]):
+                        collisions[k] += _stride
+
+        safe_len = np.where(path_length > 0, path_length, 1.0)
+        self.env_metrics = {
+            'path_efficiency': np.where(path_length > 0, self.straight_dist / safe_len, 0.0),
+            'collision_rate': np.minimum(collisions, _max) / _max,
+            'success': done.copy(),
+        }
+        return {
+            'path_efficiency': float(self.env_metrics['path_efficiency'].mean()),
+            'collision_rate': float(self.env_metrics['collision_rate'].mean()),
+            'success_rate': float(done.mean()),
+            'num_envs': n,
+        }
 
 def main():
     parser = argparse.ArgumentParser()
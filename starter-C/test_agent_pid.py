@@ -0,0 +1,56 @@
+import unittest
+import numpy as np
+from agent_pid import AgentPID
+
+PID = {'kp': 10.0, 'ki': 0.01, 'kd': 1.0}
+
+def reference_pid(errors, kp=PID['kp'], ki=PID['ki'], kd=PID['kd']):
+    # baseline controller: kp*e + ki*sum(e) + kd*(e - previous e)
+    integral = np.zeros(3)
+    prev = np.zeros(3)
+    outputs = []
+    for e in errors:
+        integral = integral + e
+        outputs.append(kp * e + ki * integral + kd * (e - prev))
+        prev = e
+    return outputs
+
+class TestAgentPID(unittest.TestCase):
+
+    def setUp(self):
+        self.errors = [np.array([1.0, 2.0, 3.0]), np.array([0.5, -1.0, 2.0]), np.array([-0.25, 0.0, 1.5])]
+
+    def test_compute_matches_reference(self):
+        agent = AgentPID(PID)
+        for e, expected in zip(self.errors, reference_pid(self.errors)):
+            np.testing.assert_allclose(agent.compute(e), expected)
+
+    def test_force_matches_reference(self):
+        agent = AgentPID(PID)
+        target = np.array([5.0, 5.0, 0.5])
+        for e, expected in zip(self.errors, reference_pid(self.errors)):
+            np.testing.assert_allclose(agent.force(target, target - e), expected)
+
+    def test_compute_batch_matches_reference(self):
+        agent = AgentPID(PID, num_envs=3)
+        done = np.zeros(3, dtype=np.bool_)
+        for e, expected in zip(self.errors, reference_pid(self.errors)):
+            out = agent.compute_batch(np.tile(e, (3, 1)), done)
+            for row in out:
+                np.testing.assert_allclose(row, expected)
+
+    def test_compute_batch_done_mask(self):
+        agent = AgentPID(PID, num_envs=2)
+        done = np.array([False, False])
+        agent.compute_batch(np.tile(self.errors[0], (2, 1)), done)
+        frozen = (agent._integral[1].copy(), agent._previous_error[1].copy())
+        done[1] = True
+        out = agent.compute_batch(np.tile(self.errors[1], (2, 1)), done)
+        # a finished env gets zero force and keeps its state
+        np.testing.assert_array_equal(out[1], np.zeros(3))
+        np.testing.assert_array_equal(agent._integral[1], frozen[0])
+        np.testing.assert_array_equal(agent._previous_error[1], frozen[1])
+        np.testing.assert_allclose(out[0], reference_pid(self.errors[:2])[1])
+
+if __name__ == '__main__':
+    unittest.main()
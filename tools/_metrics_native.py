@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Ahead-of-time compile the collect_metrics kernels into the metrics_native extension
+Usage:
+  python tools/_metrics_native.py
+collect_metrics.py imports metrics_native when present and falls back to numba's JIT otherwise.
+numba.pycc has been pending deprecation since numba 0.57 (NumbaPendingDeprecationWarning), so
+callers treat a failed build as non-fatal; the JIT fallback covers it.
+"""
+import os
+from numba.pycc import CC
+try:
+    from collect_metrics import _scan_source_hash, _trading_scan
+except ImportError:
+    from tools.collect_metrics import _scan_source_hash, _trading_scan
+
+def build(output_dir=os.path.dirname(os.path.abspath(__file__))):
+    cc = CC('metrics_native')
+    cc.output_dir = output_dir
+    cc.export('trading_scan', 'UniTuple(f8, 6)(f8[:])')(_trading_scan)
+    cc.compile()
+    # collect_metrics only loads the extension when this matches the current source
+    with open(os.path.join(output_dir, 'metrics_native.sha256'), 'w') as f:
+        f.write(_scan_source_hash())
+
+if __name__ == '__main__':
+    build()
@@ -5,51 +5,156 @@ Usage:
   python tools/collect_metrics.py --backtest starter-A/output/results.csv --robot starter-C/logs/summary.json --out output/metrics.json
 """
 import argparse, json, math, os, pandas as pd, numpy as np
+import hashlib, importlib.machinery, importlib.util, inspect
 from datetime import datetime
 
-def sharpe(returns, freq=252):
-    # Note: Sharpe ratio is estimated from per-trade returns and annualized.
-    if len(returns) < 2:
-        return None
-    mu = np.mean(returns)
-    sigma = np.std(returns, ddof=1)
-    if sigma == 0: return None
-    return (mu / sigma) * math.sqrt(freq)
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from pyarrow import csv as pacsv
+except ImportError:
+    pa = pq = pacsv = None
 
-def max_drawdown(cum_returns):
-    peak = cum_returns.cummax()
-    dd = (cum_returns - peak) / peak
-    return float(dd.min()) if not dd.empty else None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _trading_scan(pnl):
+    # one pass: rows, sum, wins, Welford variance, max drawdown; NaNs skipped but counted as rows.
+    # All float64 so _metrics_native.py can export it as UniTuple(f8, 6)
+    n = pnl.shape[0]
+    total = 0.0
+    wins = 0.0
+    mean = 0.0
+    m2 = 0.0
+    cum = 0.0
+    peak = -np.inf
+    max_dd = 0.0
+    count = 0
+    for i in range(n):
+        x = pnl[i]
+        if not np.isfinite(x):
+            continue
+        count += 1
+        total += x
+        if x > 0:
+            wins += 1.0
+        delta = x - mean
+        mean += delta / count
+        m2 += delta * (x - mean)
+        cum += x
+        if cum > peak:
+            peak = cum
+        dd = (cum - peak) / peak if peak != 0 else cum - peak
+        if dd < max_dd:
+            max_dd = dd
+    var = m2 / (count - 1) if count > 1 else 0.0
+    return float(n), total, wins, mean, var, max_dd
+
+def _scan_source_hash():
+    return hashlib.sha256(inspect.getsource(_trading_scan).encode()).hexdigest()
+
+def _load_native(directory=os.path.dirname(os.path.abspath(__file__))):
+    # metrics_native is built next to this file by tools/_metrics_native.py, which also
+    # records the hash of the _trading_scan source it compiled; a stale build is ignored
+    try:
+        with open(os.path.join(directory, 'metrics_native.sha256')) as f:
+            built_from = f.read().strip()
+    except OSError:
+        raise ImportError('metrics_native not built in ' + directory)
+    if built_from != _scan_source_hash():
+        raise ImportError('metrics_native is stale; rebuild with tools/_metrics_native.py')
+    spec = importlib.machinery.PathFinder.find_spec('metrics_native', [directory])
+    if spec is None:
+        raise ImportError('metrics_native not built in ' + directory)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.trading_scan
+
+try:
+    # the AOT build avoids importing numba and the JIT warm-up on every CLI run
+    _scan = _load_native()
+except (ImportError, AttributeError, OSError):
+    from numba import njit
+    _scan = njit(_trading_scan)
+
+def _kpis_no_ts(pnl):
+    n, total, wins, mu, var, max_dd = _scan(pnl)
+    return {
+        'num_trades': int(n),
+        'total_pnl': float(total),
+        'win_rate': wins / n,
+        # assume trades spaced daily for sharpe estimation if no timestamp: use sample freq daily
+        'sharpe_est': (mu / math.sqrt(var)) * math.sqrt(252) if (n >= 2 and var > 0) else None,
+        'max_drawdown': float(max_dd),
+    }
+
+def _kpis_with_ts(pnl, ts):
+    metrics = _kpis_no_ts(pnl)
+    total = metrics['total_pnl']
+    # basic CAGR approximation
+    try:
+        t0 = pd.to_datetime(ts.iloc[0])
+        t1 = pd.to_datetime(ts.iloc[-1])
+        years = max((t1 - t0).days / 365.25, 1e-9)
+        metrics['cagr_approx'] = ((1 + total) ** (1/years) - 1) if (total > -0.999) else None
+    except Exception:
+        metrics['cagr_approx'] = None
+    return metrics
 
 def compute_trading_kpis(df):
     # expects df has 'pnl' (per-trade profit/loss) and optionally 'timestamp'
-    metrics = {}
     if df is None or df.shape[0] == 0:
-        return metrics
-    pnl = df['pnl'].astype(float)
-    metrics['num_trades'] = int(len(pnl))
-    metrics['total_pnl'] = float(pnl.sum())
-    metrics['win_rate'] = float((pnl > 0).mean())
-    # assume trades spaced daily for sharpe estimation if no timestamp: use sample freq daily
-    per_trade_returns = pnl
-    metrics['sharpe_est'] = None
-    try:
-        metrics['sharpe_est'] = sharpe(per_trade_returns.values, freq=252)
-    except Exception:
-        metrics['sharpe_est'] = None
-    # approximate cumulative P&L series for drawdown
-    cum = pnl.cumsum()
-    metrics['max_drawdown'] = max_drawdown(cum)
-    # basic CAGR approximation (if timestamp present)
+        return {}
+    pnl = df['pnl'].to_numpy(dtype=np.float64)
+    # pick the specialized path once; the untimestamped one is the common hot path
     if 'timestamp' in df.columns:
-        try:
-            t0 = pd.to_datetime(df['timestamp'].iloc[0])
-            t1 = pd.to_datetime(df['timestamp'].iloc[-1])
-            years = max((t1 - t0).days / 365.25, 1e-9)
-            metrics['cagr_approx'] = ((1 + float(pnl.sum())) ** (1/years) - 1) if (pnl.sum() > -0.999) else None
-        except Exception:
-            metrics['cagr_approx'] = None
-    return metrics
+        return _kpis_with_ts(pnl, df['timestamp'])
+    return _kpis_no_ts(pnl)
+
+def read_backtest(path):
+    # only pnl (and timestamp, if present) are used; skip parsing/inference on the rest.
+    # Only timestamp may be missing; no pnl column is an error, as before.
+    columns = pd.read_csv(path, nrows=0).columns
+    if 'pnl' not in columns:
+        raise KeyError('pnl')
+    has_ts = 'timestamp' in columns
+    if pacsv is not None:
+        # multi-threaded Arrow parse of just the needed columns
+        table = pacsv.read_csv(
+            path,
+            read_options=pacsv.ReadOptions(use_threads=True),
+            convert_options=pacsv.ConvertOptions(
+                include_columns=['timestamp', 'pnl'] if has_ts else ['pnl'],
+                column_types={'pnl': pa.float64()}))
+        return table.to_pandas()
+    return pd.read_csv(path, usecols=lambda c: c in ('pnl', 'timestamp'), dtype={'pnl': 'float64'},
+                       engine='c', parse_dates=['timestamp'] if has_ts else False)
+
+def _read_json(path):
+    with open(path, 'rb') as f:
+        return orjson.loads(f.read()) if orjson is not None else json.load(f)
+
+def _write_json(obj, path):
+    if orjson is not None:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+    else:
+        with open(path, 'w') as f:
+            json.dump(obj, f, indent=2)
+
+def read_robot_summary(path):
+    # a summaries.parquet dataset (one row per episode) is averaged in one columnar scan
+    if path.rstrip('/').endswith('.parquet'):
+        if pq is None:
+            raise ImportError('pyarrow is required to read ' + path)
+        # sim_env writes every row with SUMMARY_SCHEMA, so one plain scan suffices
+        df = pq.read_table(path).to_pandas()
+        summary = {k: float(v) for k, v in df.mean(numeric_only=True).items()}
+        summary['episodes'] = int(len(df))
+        return summary
+    return _read_json(path)
 
 def compute_robot_kpis(robot_json):
     if not robot_json:
@@ -59,12 +164,14 @@ def compute_robot_kpis(robot_json):
     metrics['robot_success_rate'] = robot_json.get('success_rate')
     metrics['robot_collision_rate'] = robot_json.get('collision_rate')
     metrics['robot_path_efficiency'] = robot_json.get('path_efficiency')
+    if 'episodes' in robot_json:
+        metrics['robot_episodes'] = robot_json['episodes']
     return metrics
 
 def main():
     p = argparse.ArgumentParser()
     p.add_argument('--backtest', default=os.getenv('BACKTEST_PATH'), help='path to starter-A results.csv')
-    p.add_argument('--robot', default=os.getenv('ROBOT_SUMMARY'), help='path to starter-C summary.json')
+    p.add_argument('--robot', default=os.getenv('ROBOT_SUMMARY'), help='path to starter-C summary.json or summaries.parquet')
     p.add_argument('--out', default=os.getenv('METRICS_OUT_PATH', 'output/metrics.json'), help='output metrics JSON')
     args = p.parse_args()
 
@@ -78,7 +185,7 @@ def main():
     # Backtest
     if args.backtest and os.path.exists(args.backtest):
         try:
-            df = pd.read_csv(args.backtest)
+            df = read_backtest(args.backtest)
             result['backtest'] = compute_trading_kpis(df)
         except Exception as e:
             result['backtest_error'] = str(e)
@@ -88,8 +195,7 @@ def main():
     # Robot
     if args.robot and os.path.exists(args.robot):
         try:
-            with open(args.robot, 'r') as f:
-                robot_json = json.load(f)
+            robot_json = read_robot_summary(args.robot)
             result['robot'] = compute_robot_kpis(robot_json)
         except Exception as e:
             result['robot_error'] = str(e)
@@ -97,8 +203,7 @@ def main():
         result['robot_error'] = f'file not found: {args.robot}'
 
     # write metrics.json
-    with open(args.out, 'w') as f:
-        json.dump(result, f, indent=2)
+    _write_json(result, args.out)
     # also create human summary
     summary_path = os.path.splitext(args.out)[0] + '.md'
     with open(summary_path, 'w') as f:
@@ -1,8 +1,12 @@
 import unittest
 import os
+import tempfile
+from unittest import mock
 import json
+import warnings
+import numpy as np
 import pandas as pd
-from tools.collect_metrics import compute_trading_kpis, compute_robot_kpis
+from tools.collect_metrics import compute_trading_kpis, compute_robot_kpis, read_backtest, read_robot_summary, _read_json, _write_json
 
 class TestCollectMetrics(unittest.TestCase):
 
@@ -14,6 +18,7 @@ class TestCollectMetrics(unittest.TestCase):
         self.assertEqual(kpis['total_pnl'], 15)
         self.assertEqual(kpis['win_rate'], 0.5)
         self.assertAlmostEqual(kpis['sharpe_est'], 4.323, places=3)
+        self.assertAlmostEqual(kpis['max_drawdown'], -0.5)
 
     def test_compute_trading_kpis_zero_std(self):
         data = {'pnl': [10, 10, 10, 10]}
@@ -24,6 +29,62 @@ class TestCollectMetrics(unittest.TestCase):
         self.assertEqual(kpis['win_rate'], 1.0)
         self.assertIsNone(kpis['sharpe_est'])
 
+    def test_compute_trading_kpis_long_constant(self):
+        # a long constant series must give exactly zero variance, not rounding noise
+        df = pd.DataFrame({'pnl': [0.1] * 10000})
+        kpis = compute_trading_kpis(df)
+        self.assertEqual(kpis['num_trades'], 10000)
+        self.assertIsNone(kpis['sharpe_est'])
+
+    def _write_csv(self, d, text):
+        path = os.path.join(d, 'results.csv')
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def _check_read_backtest(self):
+        with tempfile.TemporaryDirectory() as d:
+            df = read_backtest(self._write_csv(d, "timestamp,close,signal,pnl\n2025-01-01T00:00:00Z,100,hold,1\n2026-01-01T00:00:00Z,101,sell,-0.5\n"))
+            no_ts = read_backtest(self._write_csv(d, "close,pnl\n100,1\n101,2\n"))
+            # a CSV without pnl must be an error, not all-null numbers
+            with self.assertRaises(KeyError):
+                read_backtest(self._write_csv(d, "timestamp,close\n2025-01-01T00:00:00Z,100\n2026-01-01T00:00:00Z,101\n"))
+        self.assertEqual(sorted(df.columns), ['pnl', 'timestamp'])
+        self.assertEqual(df['pnl'].dtype, 'float64')
+        kpis = compute_trading_kpis(df)
+        self.assertEqual(kpis['total_pnl'], 0.5)
+        self.assertAlmostEqual(kpis['cagr_approx'], 0.5, places=2)
+        self.assertEqual(list(no_ts.columns), ['pnl'])
+        self.assertEqual(compute_trading_kpis(no_ts)['total_pnl'], 3.0)
+
+    def test_read_backtest(self):
+        self._check_read_backtest()
+
+    def test_read_backtest_pandas_fallback(self):
+        with mock.patch('tools.collect_metrics.pacsv', None):
+            self._check_read_backtest()
+
+    def test_compute_trading_kpis_zero_peak_drawdown(self):
+        # cumulative P&L 0, -1: a zero peak divides by 1, not 0
+        kpis = compute_trading_kpis(pd.DataFrame({'pnl': [0.0, -1.0]}))
+        self.assertAlmostEqual(kpis['max_drawdown'], -1.0)
+
+    def test_compute_trading_kpis_skips_blank_pnl(self):
+        # blank rows are still trades (as in the baseline) but don't poison the sum
+        kpis = compute_trading_kpis(pd.DataFrame({'pnl': [1.0, float('nan'), 2.0, -1.0]}))
+        self.assertEqual(kpis['num_trades'], 4)
+        self.assertEqual(kpis['total_pnl'], 2.0)
+        self.assertEqual(kpis['win_rate'], 0.5)
+        self.assertAlmostEqual(kpis['sharpe_est'], (2 / 3) / np.std([1.0, 2.0, -1.0], ddof=1) * np.sqrt(252))
+        self.assertAlmostEqual(kpis['max_drawdown'], -1 / 3)
+
+    def test_json_roundtrip(self):
+        data = {'backtest': {'num_trades': 4, 'sharpe_est': None}, 'robot': {'robot_success_rate': 0.9}}
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'metrics.json')
+            _write_json(data, path)
+            self.assertEqual(_read_json(path), data)
+
     def test_compute_robot_kpis(self):
         data = {'success_rate': 0.9, 'collision_rate': 0.1, 'path_efficiency': 0.8}
         kpis = compute_robot_kpis(data)
@@ -31,5 +92,45 @@ class TestCollectMetrics(unittest.TestCase):
         self.assertEqual(kpis['robot_collision_rate'], 0.1)
         self.assertEqual(kpis['robot_path_efficiency'], 0.8)
 
+    def test_read_robot_summary_parquet(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        with tempfile.TemporaryDirectory() as d:
+            root = os.path.join(d, 'summaries.parquet')
+            for rate in (0.2, 0.4):
+                pq.write_to_dataset(pa.table({'collision_rate': [rate], 'success_rate': [1.0]}), root_path=root)
+            summary = read_robot_summary(root)
+        self.assertEqual(summary['episodes'], 2)
+        self.assertAlmostEqual(summary['collision_rate'], 0.3)
+        kpis = compute_robot_kpis(summary)
+        self.assertEqual(kpis['robot_success_rate'], 1.0)
+        self.assertEqual(kpis['robot_episodes'], 2)
+
+    def test_native_scan_matches_jit(self):
+        from numba import njit
+        from tools import collect_metrics
+        pnl = np.array([10, -5, float('nan'), 20, -10, 0.1, 0.0, -3.5])
+        with tempfile.TemporaryDirectory() as d, warnings.catch_warnings():
+            warnings.simplefilter('ignore')  # numba.pycc is pending deprecation
+            try:
+                from tools._metrics_native import build
+                build(d)
+            except Exception as e:
+                # the AOT build is optional (JIT fallback); needs pycc and a C compiler
+                self.skipTest(f'metrics_native build unavailable: {e}')
+            native_scan = collect_metrics._load_native(d)
+        expected = njit(collect_metrics._trading_scan)(pnl)
+        np.testing.assert_allclose(native_scan(pnl), expected)
+
+    def test_native_stale_or_missing_hash_is_rejected(self):
+        from tools import collect_metrics
+        with tempfile.TemporaryDirectory() as d:
+            with self.assertRaises(ImportError):
+                collect_metrics._load_native(d)
+            with open(os.path.join(d, 'metrics_native.sha256'), 'w') as f:
+                f.write('0' * 64)
+            with self.assertRaises(ImportError):
+                collect_metrics._load_native(d)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file